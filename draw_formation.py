@@ -1,41 +1,43 @@
 import csv
 import math
-import csv
-
+from functools import lru_cache
+from itertools import zip_longest
+from operator import itemgetter
+import numpy as np
+import pandas as pd
+
+# The drawing only depends on (total_people, row_size), so repeat calls are served from the cache
+@lru_cache(maxsize=512)
 def create_contingent_ascii(total_people, row_size=5):
     columns = math.ceil(total_people / row_size)
 
     total_grid_size = row_size * columns
     missing = total_grid_size - total_people
     
-    seats = [[True for _ in range(columns)] for _ in range(row_size)]
-    
-    if missing > 0:
-        col_to_remove = 1
-        seats_removed = 0
-        
-        while seats_removed < missing and col_to_remove < columns:
-            # go from bottom row=4 (index=4) up to top row=0
-            for row in range(row_size-1, -1, -1):
-                if seats_removed >= missing:
-                    break  # we've removed all we need
-                # remove this seat (row, col_to_remove)
-                seats[row][col_to_remove] = False
-                seats_removed += 1
-            col_to_remove += 1
+    seats = np.ones((row_size, columns), dtype=bool)
     
-    result = []
-    for row in range(row_size):
-        row_str = []
-        for col in range(columns):
-            if seats[row][col]:
-                row_str.append("x")
-            else:
-                row_str.append(" ")
-        # Join them with a space
-        result.append(" ".join(row_str))
+    if missing > 0 and columns > 1:
+        # Empty seats are taken from column 1 onwards, bottom row first
+        full_cols = min(missing // row_size, columns - 1)
+        tail = missing % row_size
+        seats[:, 1:1 + full_cols] = False
+        if tail and 1 + full_cols < columns:
+            seats[row_size - tail:, 1 + full_cols] = False
     
-    return "\n".join(result)
+    # Render straight into a byte grid: seats sit at even offsets of each "x x x" row, and the row's trailing
+    # separator slot holds the newline, so the whole drawing decodes in one go
+    text = np.full((row_size, 2 * columns), ord(" "), dtype=np.uint8)
+    text[:, ::2] = np.where(seats, ord("x"), ord(" "))
+    text[:, -1:] = ord("\n")
+    return text.tobytes()[:-1].decode("ascii")
+
+# Every formation line is right-aligned to this width, so each formation ends on a 50-char boundary
+_PAD50 = " " * 50
+
+# Lay out one row of the parade: the formations' (pre-padded) lines side by side. Stripping the left edge drops
+# the padding of the leading formation, along with any leading formations that are blank on that line
+def _assemble_row(formations):
+    return ["".join(parts).lstrip() for parts in zip_longest(*formations, fillvalue=_PAD50)]
 
 def create_parade_formation(contingents, contingent_row_size=5, capacity=90):
     contingent_displays = []
@@ -48,45 +50,20 @@ def create_parade_formation(contingents, contingent_row_size=5, capacity=90):
         composition = ", ".join(f"{n} {g}" for g, n in cont.items())
         header = f"C{idx} ({composition})"
         
-        contingent_displays.append((capacity_diff, idx, header + "\n" + formation))
+        # Split and pad each display once, up front
+        lines = [line.rjust(50) for line in (header + "\n" + formation).split("\n")]
+        contingent_displays.append((capacity_diff, idx, lines))
     
-    contingent_displays.sort(key=lambda x: x[0])
+    contingent_displays.sort(key=itemgetter(0))
     sorted_displays = [x[2] for x in contingent_displays]
 
     first_row_count = (len(contingents) + 1) // 2
     first_row = sorted_displays[:first_row_count]
     second_row = sorted_displays[first_row_count:]
 
-    first_row_lines = [display.split('\n') for display in first_row]
-    second_row_lines = [display.split('\n') for display in second_row]
-
-    result = []
-    
-    # First row
-    for line_idx in range(max(len(x) for x in first_row_lines)):
-        line_parts = []
-        for formation in first_row_lines:
-            if line_idx < len(formation):
-                line_parts.append(formation[line_idx].rjust(50))
-            else:
-                line_parts.append(" " * 50)
-
-        combined_line = "".join(line_parts).lstrip()
-        result.append(combined_line)
-    
+    result = _assemble_row(first_row)
     result.append("")
-    
-    # Second row
-    for line_idx in range(max(len(x) for x in second_row_lines)):
-        line_parts = []
-        for formation in second_row_lines:
-            if line_idx < len(formation):
-                line_parts.append(formation[line_idx].rjust(50))
-            else:
-                line_parts.append(" " * 50)
-
-        combined_line = "".join(line_parts).lstrip()
-        result.append(combined_line)
+    result.extend(_assemble_row(second_row))
 
     return "\n".join(result)
 
@@ -95,79 +72,73 @@ def data_from_csv (csv_dir):
     capacity = None
     contingents = []
 
-    with open(csv_dir, 'r', newline='', encoding='utf-8') as csvfile:
-        all_rows = list(csv.reader(csvfile))
+    # Single pass over the file. "params" rows are parsed as we go; for "details" we keep each contingent row's group
+    # assignments so pandas can split them afterwards. Every other row is skipped
+    state = None
+    sections_seen = set()
+    details_groups = []
 
-    all_rows = [[col.strip() for col in row] for row in all_rows]
+    with open(csv_dir, 'r', newline='', encoding='utf-8') as csvfile:
+        reader = csv.reader(csvfile)
+        for row in reader:
+            if state is None:
+                if len(row) == 1:
+                    title = row[0].strip()
+                    if title == "Input Parameters" and "params" not in sections_seen:
+                        state = "params"
+                    elif title == "Contingent Details" and "details" not in sections_seen:
+                        state = "details"
+
+                    if state is not None:
+                        sections_seen.add(state)
+                        next(reader, None)  # skip the column header row
+                continue
+
+            row = [col.strip() for col in row]
+
+            if not row:
+                state = None
+            elif state == "params":
+                if len(row) == 1 and "Input Group Sizes" in row[0]:
+                    state = None
+                elif len(row) == 2:
+                    param_name, param_value = row
+
+                    if param_name == "Contingent Row Size":
+                        contingent_row_size = int(param_value)
+                    elif param_name == "Contingent Capacity":
+                        capacity = int(param_value)
+            elif state == "details":
+                if len(row) == 1 and "Summary Statistics" in row[0]:
+                    state = None
+                elif len(row) == 4:
+                    # Expect 4 columns: Contingent #, Total People, Group Assignments, Number of Groups
+                    # e.g.: 4,85,"IDTI:21, SI:64",2
+                    details_groups.append(row[2])
+
+            # Both sections parsed, nothing left to read
+            if state is None and len(sections_seen) == 2:
+                break
 
-    start_idx = -1
-    for i, row in enumerate(all_rows):
-        if len(row) == 1 and row[0] == "Input Parameters":
-            start_idx = i
-            break
+    if details_groups:
+        # Group assignments can have multiple groups separated by commas, e.g., "IDTI:21, SI:64".
+        # Explode to one "name:size" chunk per row, keeping the contingent's row index
+        details = pd.Series(details_groups, dtype=str)
+        assignments = details.str.split(",").explode().str.strip()
+        assignments = assignments[assignments.str.contains(":", regex=False, na=False)]
+        pairs = assignments.str.split(":", n=1)
+        grp_names = pairs.str[0].str.strip().str.strip('"')
+        grp_sizes = pairs.str[1].str.strip().str.strip('"').astype(int)
 
-    if start_idx != -1:
-        idx = start_idx + 2
-        while idx < len(all_rows):
-            if not all_rows[idx] or len(all_rows[idx]) == 0:
-                break
-            if len(all_rows[idx]) == 1 and "Input Group Sizes" in all_rows[idx][0]:
-                break
-            
-            parts = all_rows[idx]
-            if len(parts) == 2:
-                param_name = parts[0].strip()
-                param_value = parts[1].strip()
-
-                if param_name == "Contingent Row Size":
-                    contingent_row_size = int(param_value)
-                elif param_name == "Contingent Capacity":
-                    capacity = int(param_value)
-            idx += 1
+        contingents = [{} for _ in range(len(details))]
+        for row_idx, grp_name, grp_size in zip(assignments.index, grp_names, grp_sizes):
+            contingents[row_idx][grp_name] = grp_size
 
     if contingent_row_size is None:
         contingent_row_size = 5  
     if capacity is None:
         capacity = 90  
 
-    details_idx = -1
-    for i, row in enumerate(all_rows):
-        if len(row) == 1 and row[0] == "Contingent Details":
-            details_idx = i
-            break
-
-    if details_idx != -1:
-        idx = details_idx + 2
-        while idx < len(all_rows):
-            row = all_rows[idx]
-
-            if not row or len(row) == 0:
-                break
-            if len(row) == 1 and "Summary Statistics" in row[0]:
-                break
-
-            # Expect 4 columns: Contingent #, Total People, Group Assignments, Number of Groups
-            # e.g.: ["4", "85", "IDTI:21, SI:64", "2"]
-            if len(row) == 4:
-                # Group assignments can have multiple groups separated by commas,
-                # e.g., "IDTI:21, SI:64"
-                group_assignments_str = row[2].strip()
-                
-                group_dict = {}
-                # Split by ',' to get each chunk like "IDTI:21" or " SI:64"
-                assignments = group_assignments_str.split(",")
-                for assignment in assignments:
-                    assignment = assignment.strip()
-                    if ":" in assignment:
-                        grp_name, grp_size = assignment.split(":", 1)
-                        grp_name = grp_name.strip().strip('"')
-                        grp_size = grp_size.strip().strip('"')
-                        group_dict[grp_name] = int(grp_size)
-
-                contingents.append(group_dict)
-            
-            idx += 1
-
     print("Parsed contingents:", contingents)
     print("Contingent row size:", contingent_row_size)
     print("Contingent capacity:", capacity)
@@ -194,24 +165,13 @@ def main():
     reordered_contingents = [None] * len(contingents)
 
     # First, place the contingents mentioned in positions_map
-    for i in range(len(contingents)):
-        old_pos = i + 1 
-        if old_pos in positions_map:
-            new_pos_index = positions_map[old_pos] - 1
-            reordered_contingents[new_pos_index] = contingents[i]
-
-    # Next, fill in the gaps for contingents not in positions_map
-    fill_index = 0
-    for i in range(len(contingents)):
-        if reordered_contingents[i] is None:
-            # Find the next old contingent that was NOT placed
-            while fill_index < len(contingents):
-                old_pos = fill_index + 1
-                if old_pos not in positions_map:
-                    reordered_contingents[i] = contingents[fill_index]
-                    fill_index += 1
-                    break
-                fill_index += 1
+    for old_pos, new_pos in positions_map.items():
+        if old_pos <= len(contingents):
+            reordered_contingents[new_pos - 1] = contingents[old_pos - 1]
+
+    # Next, fill in the gaps, in order, with the contingents not in positions_map
+    unplaced = (cont for old_pos, cont in enumerate(contingents, start=1) if old_pos not in positions_map)
+    reordered_contingents = [cont if cont is not None else next(unplaced, None) for cont in reordered_contingents]
 
     formation = create_parade_formation(reordered_contingents, contingent_row_size, capacity)
 
@@ -1,12 +1,18 @@
-from ortools.linear_solver import pywraplp
+from ortools.sat.python import cp_model
+from concurrent.futures import ProcessPoolExecutor
+import argparse
 import csv
 from datetime import datetime
+import hashlib
+import io
+from itertools import product, repeat
 import json
+import numpy as np
+import os
 from pathlib import Path
 from halo import Halo
 from termcolor import colored
 import time
-from threading import Thread
 
 def load_config():
     """Load configuration from input.json if it exists, otherwise return defaults."""
@@ -31,7 +37,8 @@ def load_config():
         "alpha": 1.0,
         "beta": 5.0,
         "fix_num_contingents": 12,
-        "time_limit": 60
+        "time_limit": 60,
+        "strategy": "weighted"
     }
 
     try:
@@ -50,6 +57,53 @@ def load_config():
 
     return defaults
 
+def greedy_assign(A, capacity, num_contingents):
+    """
+    Greedy first-fit-decreasing packing of the group sizes in A into at most num_contingents contingents.
+
+    Only used to warm-start the solver, so it ignores strict_min_capacity, avoid_split and row-size rules; people that don't fit anywhere are left unassigned.
+
+    Args:
+        A (array-like): Number of people left to allocate for each group.
+        capacity (int): Max size for each contingent.
+        num_contingents (int): Number of contingents to pack into.
+
+    Returns:
+        np.ndarray: int32 array of shape (num_contingents, len(A)) with the number of people from each group in each contingent.
+    """
+    sizes = np.asarray(A, dtype=np.int32)
+    loads = np.zeros(num_contingents, dtype=np.int32)
+    assignment = np.zeros((num_contingents, len(sizes)), dtype=np.int32)
+
+    for i in np.argsort(-sizes, kind="stable"):
+        remaining = sizes[i]
+        if remaining == 0:
+            continue
+
+        # Prefer the first contingent that can take the whole group
+        fits = np.flatnonzero(loads + remaining <= capacity)
+        if fits.size:
+            assignment[fits[0], i] = remaining
+            loads[fits[0]] += remaining
+            continue
+
+        # Otherwise split the group across the first contingents with room, filling each in turn
+        room = capacity - loads
+        room_before = np.cumsum(room) - room
+        take = np.clip(remaining - room_before, 0, room)
+        assignment[:, i] = take
+        loads += take
+
+    # Renumber contingents by non-increasing fill to match the solver's symmetry-breaking order
+    return assignment[np.argsort(-loads, kind="stable")]
+
+def contingents_from_matrix(vals, groups):
+    """Turn a (contingent, group) matrix of head counts into a list of {group_label: count} dicts, skipping empty contingents."""
+    return [
+        {groups[i]: int(vals[c, i]) for i in np.nonzero(vals[c])[0]}
+        for c in np.nonzero(vals.sum(axis=1))[0]
+    ]
+
 def allocate_contingents(
     group_sizes,
     capacity,
@@ -59,10 +113,14 @@ def allocate_contingents(
     beta=5.0,
     use_all=True,
     fix_num_contingents=None,
-    time_limit=60
+    time_limit=60,
+    verbose=True,
+    num_workers=None,
+    strategy="weighted",
+    return_optimal=False
 ):
     """
-    Solve the parade allocation problem using an Integer Linear Program (ILP) with OR-Tools. Certain groups may be pre-chunked into their own full or partial contingents if marked with a special flag (e.g., 'avoid_split' = True).
+    Solve the parade allocation problem as an integer program with OR-Tools' CP-SAT solver. Certain groups may be pre-chunked into their own full or partial contingents if marked with a special flag (e.g., 'avoid_split' = True).
     
     Additionally, if 'avoid_split' is True AND a group's size is less than 'capacity', that group is forced to occupy exactly one contingent, and that contingent must be completely filled (i.e., equal to capacity) given a multiple of contingent_row_size.
     
@@ -81,61 +139,56 @@ def allocate_contingents(
         beta (float): Weight for penalizing mixing (number of distinct groups in a contingent).
         use_all (bool): If True, forces all group members to be used. If False, allows partial usage.
         fix_num_contingents (int or None): If not None, enforce exactly this many contingents must be used. Otherwise, the solver decides.
+        time_limit (float): Maximum solver time in seconds.
+        verbose (bool): If False, print no progress messages and show no spinner.
+        num_workers (int or None): Number of CP-SAT search workers. Defaults to os.cpu_count().
+        strategy (str): "weighted" minimizes alpha * underfill + beta * mixing in one solve. "lex" first minimizes
+            underfill, then minimizes mixing without letting underfill get worse, splitting time_limit between the two.
+        return_optimal (bool): If True, also return whether the result is proven optimal.
 
     Returns:
         (contingents, objective_value) where:
          - contingents: a list of dicts, each {group_label: count_assigned}.
          - objective_value: the optimized objective value (lower is better).
+        With return_optimal=True, (contingents, objective_value, optimal) where optimal is False if the solver
+        stopped at the time limit before proving its best solution optimal.
     """
+    if strategy not in ("weighted", "lex"):
+        raise ValueError(f"Unknown strategy '{strategy}', expected 'weighted' or 'lex'")
+
     start_time = time.time()
-    spinner = Halo(text='', spinner='dots')
-    current_message = ['']  # Using list to allow modification in closure
-    
-    # Thread function to update spinner text
-    def update_time():
-        while spinner.spinner_id: # while spinner active
-            elapsed = time.time() - start_time
-            spinner.text = f"{current_message[0]} ({elapsed:.2f}s)"
-            time.sleep(0.1) 
-    
-    # Update spinner message (without affecting the time update)
+    # Progress messages and the spinner are switched off entirely when verbose=False
+    log = print if verbose else (lambda *args, **kwargs: None)
+    spinner = Halo(text='', spinner='dots', enabled=verbose)
+
+    # Spinner text is only refreshed at phase boundaries, so there is no background polling
     def update_spinner(message):
-        current_message[0] = message
-    
+        elapsed = time.time() - start_time
+        spinner.text = f"{message} ({elapsed:.2f}s)"
+
+    # Every shortcut below returns a provably optimal result; only a solve cut short by the time limit isn't
+    def result(contingents, objective_value, optimal=True):
+        return (contingents, objective_value, optimal) if return_optimal else (contingents, objective_value)
+
     spinner.start()
-    update_thread = Thread(target=update_time, daemon=True)
-    update_thread.start()
 
     try:
-        # Update spinner text with elapsed time
-        def update_spinner(message):
-            elapsed = time.time() - start_time
-            spinner.text = f"{message} ({elapsed:.2f}s)"
-
         # 1) Pre-allocate contingents for groups marked "avoid_split"
-        print(colored("\n[1/5] Pre-allocating contingents marked 'avoid_split'...", 'cyan'))
+        log(colored("\n[1/5] Pre-allocating contingents marked 'avoid_split'...", 'cyan'))
         update_spinner('Pre-allocating contingents...')
-        pre_allocated_contingents = []
-        remaining_group_sizes = {}
-
-        for g, info in group_sizes.items():
-            group_count = info["size"]
-            avoid_split = info.get("avoid_split", False)
-
-            if avoid_split and group_count > 0:
-                # Create as many full contingents of 'capacity' as we can
-                while group_count >= capacity:
-                    pre_allocated_contingents.append({g: capacity})
-                    group_count -= capacity
-                
-                # If there's a leftover smaller than capacity
-                if group_count > 0:
-                    # That leftover portion still needs to be allocated by the solver
-                    remaining_group_sizes[g] = group_count
-            else:
-                # If not avoid_split or group_count==0, 
-                # just feed the entire group_count to the solver.
-                remaining_group_sizes[g] = group_count
+        # Struct-of-arrays view of group_sizes: one label list plus parallel size / avoid_split arrays
+        labels = list(group_sizes)
+        sizes_np = np.fromiter((group_sizes[g]["size"] for g in labels), dtype=np.int32, count=len(labels))
+        avoid_np = np.fromiter((group_sizes[g].get("avoid_split", False) for g in labels), dtype=np.bool_, count=len(labels))
+
+        # avoid_split groups get as many full contingents of 'capacity' as they can fill
+        n_full = np.where(avoid_np, sizes_np // capacity, 0)
+        leftovers = sizes_np - n_full * capacity
+        pre_allocated_contingents = [{labels[g]: capacity} for g in np.repeat(np.arange(len(labels)), n_full)]
+
+        # Any leftover portion still needs to be allocated by the solver, as does every group that wasn't
+        # pre-allocated at all (not avoid_split, smaller than capacity, or empty)
+        remaining = (n_full == 0) | (leftovers > 0)
 
         # If user wants a fixed number of contingents, subtract out the contingents we already used from pre_allocated_contingents
         if fix_num_contingents is not None:
@@ -144,34 +197,121 @@ def allocate_contingents(
             fix_num_contingents = max(0, fix_num_contingents - used_pre)
 
         # Make an easy list of groups and their sizes
-        groups = list(remaining_group_sizes.keys())
-        A = [remaining_group_sizes[g] for g in groups]
-        total_people = sum(A)
+        groups = [labels[g] for g in np.flatnonzero(remaining)]
+        A_np = leftovers[remaining]
+        A = A_np.tolist()
+        total_people = int(A_np.sum())
 
         # If everything was pre-allocated (i.e. total_people=0), 
         # then just return the pre-allocated contingents and 0 objective
         if total_people == 0:
-            return pre_allocated_contingents, 0
+            spinner.succeed(colored('Everything was pre-allocated, no solver needed', 'green'))
+            return result(pre_allocated_contingents, 0)
+
+        # Pre-allocation already used up every contingent we're allowed, so nothing is left for the solver to do
+        if fix_num_contingents == 0:
+            if use_all:
+                raise ValueError(
+                    f"Pre-allocation already fills all contingents allowed by fix_num_contingents, "
+                    f"but {total_people} people are still unassigned"
+                )
+            spinner.succeed(colored('No contingents left after pre-allocation, no solver needed', 'green'))
+            return result(pre_allocated_contingents, 0)
+
+        # Exact fit: if every remaining group fills whole contingents on its own, splitting each group into
+        # full contingents has zero underfill and one group per contingent, which is optimal, so skip the solver.
+        # Only with use_all: otherwise leaving people out can be cheaper than paying the mixing term
+        full_contingents = total_people // capacity
+        if (
+            use_all
+            and strict_min_capacity <= capacity
+            and not (A_np % capacity).any()
+            and fix_num_contingents in (None, full_contingents)
+        ):
+            for g, a in zip(groups, A):
+                pre_allocated_contingents.extend({g: capacity} for _ in range(a // capacity))
+
+            total_elapsed = time.time() - start_time
+            spinner.succeed(colored(f'Exact fit, no solver needed ({total_elapsed:.2f}s)', 'green'))
+
+            return result(pre_allocated_contingents, beta * full_contingents)
 
         N = len(groups)
-        # Provide a small buffer on max number of contingents
-        max_contingents = (total_people // capacity) + 3
+        if fix_num_contingents is not None:
+            # Exactly this many contingents will be used, so don't create any spare ones
+            max_contingents = fix_num_contingents
+        else:
+            # Provide a small buffer on max number of contingents
+            max_contingents = (total_people // capacity) + 3
+            if use_all:
+                # Every used contingent then holds at least strict_min_capacity of the remaining people, so there's
+                # no point creating more than that many. Without use_all the cap could be 0 while a group pinned by
+                # 4e still needs a contingent to sit in
+                max_contingents = min(max_contingents, total_people // max(strict_min_capacity, 1))
+
+        # With use_all every person needs a seat in a contingent holding between strict_min_capacity and capacity people,
+        # which bounds how many contingents can be used. Report an impossible setup up front rather than as a failed solve
+        if use_all:
+            fewest = -(-total_people // capacity)
+            most = total_people // max(strict_min_capacity, 1)
+            if fewest > most:
+                raise ValueError(
+                    f"Can't place {total_people} remaining people in contingents of "
+                    f"{strict_min_capacity}-{capacity}: needs at least {fewest} contingents but at most {most} can be filled"
+                )
+            if fix_num_contingents is not None and not fewest <= fix_num_contingents <= most:
+                raise ValueError(
+                    f"{fix_num_contingents} contingents can't hold the {total_people} remaining people "
+                    f"with {strict_min_capacity}-{capacity} each (allowed: {fewest}-{most})"
+                )
+
+        # Groups that must stay within a single contingent (see 4e)
+        single_contingent = (avoid_np & (sizes_np < capacity))[remaining]
+
+        # Greedy first-fit-decreasing packing into as many contingents as we expect to use; warm-starts the solver below
+        greedy = greedy_assign(A_np, capacity, max_contingents)
+
+        # With use_all the objective has a simple lower bound: at least ceil(total_people / capacity) contingents
+        # (or exactly fix_num_contingents) must be used, and mixing is at least one group per used contingent and at
+        # least ceil(A[i] / capacity) contingents per group. If the greedy packing is feasible and meets that bound,
+        # it's optimal and the solver can be skipped
+        if use_all and max_contingents > 0:
+            greedy_loads = greedy.sum(axis=1)
+            used = greedy_loads > 0
+            num_used = int(used.sum())
+            mixing = int(np.count_nonzero(greedy))
+
+            min_used = fix_num_contingents if fix_num_contingents is not None else -(-total_people // capacity)
+            min_mixing = max(min_used, int((-(-A_np // capacity)).sum()))
+
+            single_pieces = greedy[:, single_contingent]
+            single_loads = greedy_loads[single_pieces.argmax(axis=0)]
+            greedy_feasible = (
+                (greedy.sum(axis=0) == A_np).all()
+                and (greedy_loads[used] >= max(strict_min_capacity, 1)).all()
+                and (fix_num_contingents is None or num_used == fix_num_contingents)
+                and (np.count_nonzero(single_pieces, axis=0) == 1).all()
+                and (single_loads % contingent_row_size == 0).all()
+            )
+
+            if greedy_feasible and num_used == min_used and (beta == 0 or mixing == min_mixing):
+                total_elapsed = time.time() - start_time
+                spinner.succeed(colored(f'Greedy packing meets the lower bound, no solver needed ({total_elapsed:.2f}s)', 'green'))
+
+                greedy_objective = alpha * (capacity * num_used - total_people) + beta * mixing
+                return result(pre_allocated_contingents + contingents_from_matrix(greedy, groups), greedy_objective)
 
         elapsed = time.time() - start_time
-        print(colored(f"     ✓ Pre-allocation complete ({elapsed:.2f}s)", 'green'))
+        log(colored(f"     ✓ Pre-allocation complete ({elapsed:.2f}s)", 'green'))
         
         update_spinner('Setting up ILP solver...')
-        print(colored("\n[2/5] Configuring solver variables and constraints...", 'cyan'))
+        log(colored("\n[2/5] Configuring solver variables and constraints...", 'cyan'))
 
-        # Create the solver
-        solver = pywraplp.Solver.CreateSolver('SCIP')
-        if not solver:
-            raise Exception("Could not create the OR-Tools solver.")
-        
-        solver.SetTimeLimit(time_limit * 1000)  # time_limit in seconds
+        # Create the model
+        model = cp_model.CpModel()
 
         elapsed = time.time() - start_time
-        print(colored(f"     ✓ Solver created ({elapsed:.2f}s)", 'green'))
+        log(colored(f"     ✓ Model created ({elapsed:.2f}s)", 'green'))
         
         update_spinner('Creating decision variables...')
 
@@ -182,85 +322,127 @@ def allocate_contingents(
         x = {}
         y = {}
         z = {}
-        BIG_M = capacity
-
-        for c in range(max_contingents):
-            z[c] = solver.BoolVar(f"z_{c}")
 
-        for i in range(N):
-            for c in range(max_contingents):
-                x[(i, c)] = solver.IntVar(0, A[i], f"x_{i}_{c}")
-                y[(i, c)] = solver.BoolVar(f"y_{i}_{c}")
+        # Index ranges and model methods used in the N * max_contingents loops below, bound once
+        contingent_ids = range(max_contingents)
+        group_ids = range(N)
+        new_int_var = model.NewIntVar
+        new_bool_var = model.NewBoolVar
+
+        for c in contingent_ids:
+            z[c] = new_bool_var(f"z_{c}")
+
+        single_contingent = single_contingent.tolist()
+        # With use_all, a group pinned to one contingent (see 4e) lands there in full, so x[i,c] is just A[i] * y[i,c]
+        # and gets no variable of its own
+        whole_only = [use_all and single for single in single_contingent]
+        for i in group_ids:
+            # y only matters for the mixing term, or to pin a group to a single contingent
+            needs_y = beta != 0 or single_contingent[i]
+            # No contingent can take more than capacity people from one group
+            x_ub = min(A[i], capacity)
+            for c in contingent_ids:
+                if needs_y:
+                    y[(i, c)] = new_bool_var(f"y_{i}_{c}")
+                if whole_only[i]:
+                    x[(i, c)] = A[i] * y[(i, c)]
+                else:
+                    x[(i, c)] = new_int_var(0, x_ub, f"x_{i}_{c}")
+
+        # Per-contingent and per-group lists of x, built once
+        x_col = [[x[(i, c)] for i in group_ids] for c in contingent_ids]
+        x_row = [[x[(i, c)] for c in contingent_ids] for i in group_ids]
+
+        # load[c] = # of people in contingent c, the per-bin load variable the constraints below work on.
+        # Its domain encodes 4a and 4f directly: either empty, or between strict_min_capacity (at least 1) and capacity
+        load_domain = cp_model.Domain(0, 0).union_with(cp_model.Domain(max(strict_min_capacity, 1), capacity))
+        load = [model.NewIntVarFromDomain(load_domain, f"load_{c}") for c in contingent_ids]
+        # Linked as one flat weighted sum, sum_i x[i,c] - load[c] == 0, instead of nesting the x sum in an equality
+        load_weights = [1] * N + [-1]
+        for c in contingent_ids:
+            model.Add(cp_model.LinearExpr.WeightedSum(x_col[c] + [load[c]], load_weights) == 0)
 
         elapsed = time.time() - start_time
-        print(colored(f"     ✓ Decision variables created ({elapsed:.2f}s)", 'green'))
+        log(colored(f"     ✓ Decision variables created ({elapsed:.2f}s)", 'green'))
         
         update_spinner('Adding constraints...')
-        print(colored("\n[3/5] Adding constraints to the model...", 'cyan'))
+        log(colored("\n[3/5] Adding constraints to the model...", 'cyan'))
         
         # Constraints
-        # 4a) Capacity: Each contingent can't exceed the target size (sum_i x[i,c] <= capacity)
-        for c in range(max_contingents):
-            solver.Add(sum(x[(i, c)] for i in range(N)) <= capacity * z[c])
-
-        # Also ensure if z[c] = 1, sum_i x[i,c] >= 1 (so the contingent can't be "used" if it's empty)
-        for c in range(max_contingents):
-            solver.Add(sum(x[(i, c)] for i in range(N)) >= z[c])
+        # 4a) Capacity: Each contingent can't exceed the target size (sum_i x[i,c] <= capacity, via load's domain),
+        # and a contingent is used exactly when it isn't empty
+        for c in contingent_ids:
+            model.Add(load[c] == 0).OnlyEnforceIf(z[c].Not())
+            model.Add(load[c] >= 1).OnlyEnforceIf(z[c])
+
+        # Contingents are interchangeable, so order them by non-increasing fill to cut out symmetric solutions.
+        # This already packs used contingents first; stating z[c] >= z[c+1] lets the solver propagate that directly
+        for c in range(max_contingents - 1):
+            model.Add(load[c] >= load[c + 1])
+            model.Add(z[c] >= z[c + 1])
+
+        # Groups with the same remaining size and the same single-contingent rule are interchangeable, so order each
+        # such pair by where its people sit (sum_c c * x[i,c]); swapping the two groups always satisfies this
+        position_weights = list(contingent_ids) + [-c for c in contingent_ids]
+        identical = {}
+        for i in group_ids:
+            identical.setdefault((A[i], single_contingent[i]), []).append(i)
+        for members in identical.values():
+            for i, j in zip(members, members[1:]):
+                model.Add(cp_model.LinearExpr.WeightedSum(x_row[i] + x_row[j], position_weights) <= 0)
 
         # 4b) Each group's total usage
-        for i in range(N):
+        for i in group_ids:
+            group_total = cp_model.LinearExpr.Sum(x_row[i])
             if use_all:
-                solver.Add(sum(x[(i, c)] for c in range(max_contingents)) == A[i])
+                model.Add(group_total == A[i])
             else:
-                solver.Add(sum(x[(i, c)] for c in range(max_contingents)) <= A[i])
-
-        # 4c) Linking x and y: x[i,c] <= BIG_M * y[i,c]
-        for i in range(N):
-            for c in range(max_contingents):
-                solver.Add(x[(i, c)] <= BIG_M * y[(i, c)])
+                model.Add(group_total <= A[i])
+
+        # 4c) Linking x and y: x[i,c] <= BIG_M_i * y[i,c], and x[i,c] == 0 whenever y[i,c] is false.
+        # BIG_M_i = min(A[i], capacity) is x[i,c]'s own upper bound, the tightest valid choice.
+        # The big-M row stays for the LP relaxation. With use_all the reverse link x[i,c] >= 1 makes y[i,c] exactly
+        # (x[i,c] > 0); without it a group pinned by 4e may still be left out (y = 1, x = 0), so the link is skipped
+        add = model.Add
+        for (i, c), y_var in y.items():
+            if whole_only[i]:
+                continue
+            x_var = x[(i, c)]
+            add(x_var <= min(A[i], capacity) * y_var)
+            add(x_var == 0).OnlyEnforceIf(y_var.Not())
+            if use_all:
+                add(x_var >= 1).OnlyEnforceIf(y_var)
 
         # 4d) If we fix the total # of contingents, sum_c z[c] = fix_num_contingents
         if fix_num_contingents is not None:
-            solver.Add(solver.Sum([z[c] for c in range(max_contingents)]) == fix_num_contingents)
+            model.Add(cp_model.LinearExpr.Sum(list(z.values())) == fix_num_contingents)
 
         # 4e) If avoid_split=True AND size < capacity, then that group must occupy exactly 1 contingent. In that chosen contingent, the total assigned is forced to be a multiple of contingent_row_size=5.
 
-        # Dictionary "m" will hold the new integer variables:
-        m = {}
+        # Totals such a contingent may take: multiples of contingent_row_size between strict_min_capacity and capacity.
+        # Without use_all the pinned group may also be left out entirely, leaving its contingent empty
+        first_multiple = -(-strict_min_capacity // contingent_row_size) * contingent_row_size
+        row_multiples = cp_model.Domain.FromValues(range(first_multiple, capacity + 1, contingent_row_size))
+        if not use_all:
+            row_multiples = row_multiples.union_with(cp_model.Domain(0, 0))
 
-        for i in range(N):
-            g_name = groups[i]
-            original_size = group_sizes[g_name]["size"]
-            avoid_split = group_sizes[g_name].get("avoid_split", False)
-
-            if avoid_split and original_size < capacity:
+        for i in group_ids:
+            if single_contingent[i]:
                 # Force this group to appear in exactly one contingent
-                solver.Add(solver.Sum([y[(i, c)] for c in range(max_contingents)]) == 1)
+                model.Add(cp_model.LinearExpr.Sum([y[(i, c)] for c in contingent_ids]) == 1)
                 
-                for c in range(max_contingents):
-                    # Create an integer variable m_{i,c} for enforcing multiples of 5
-                    m[(i, c)] = solver.IntVar(0, capacity, f"m_{i}_{c}")
-
-                    # sum_c is the total # of people in contingent c
-                    sum_c = solver.Sum(x[(i_prime, c)] for i_prime in range(N))
+                for c in contingent_ids:
+                    # If y_{(i,c)}=1, the total # of people in contingent c must be one of row_multiples.
+                    # If y_{(i,c)}=0, no restriction is imposed (the constraint is not enforced).
+                    model.AddLinearExpressionInDomain(load[c], row_multiples).OnlyEnforceIf(y[(i, c)])
 
-                    # Big-M approach:
-                    # If y_{(i,c)}=1, then sum_c = 5 * m_{(i,c)}.
-                    # If y_{(i,c)}=0, no restriction is imposed (sum_c - 5*m_{(i,c)} can be anything).
-                    BIG_M_2 = capacity  # Enough to cover all feasible sums
-
-                    solver.Add(sum_c - contingent_row_size * m[(i, c)] <= BIG_M_2 * (1 - y[(i, c)]))
-                    solver.Add(sum_c - contingent_row_size * m[(i, c)] >= -BIG_M_2 * (1 - y[(i, c)]))
-
-        # 4f) Enforce minimum capacity for each used contingent
-        for c in range(max_contingents):
-            solver.Add(sum(x[(i, c)] for i in range(N)) >= strict_min_capacity * z[c])
+        # 4f) Minimum capacity for each used contingent: covered by load's domain, since a used contingent is never empty
 
         elapsed = time.time() - start_time
-        print(colored(f"     ✓ Constraints added ({elapsed:.2f}s)", 'green'))
+        log(colored(f"     ✓ Constraints added ({elapsed:.2f}s)", 'green'))
         
         update_spinner('Setting up objective function...')
-        print(colored("\n[4/5] Setting up objective function...", 'cyan'))
+        log(colored("\n[4/5] Setting up objective function...", 'cyan'))
         
         # 5) Objective
 
@@ -268,50 +450,105 @@ def allocate_contingents(
         # 1) Underfilling: Having contingents smaller than the capacity (weighted by alpha)
         # 2) Mixing: Having multiple groups in a contingent (weighted by beta)
         
-        # Minimize [ alpha * underfill_c + beta * mixing_c ]
-        #   underfill_c = capacity - sum_i x[i,c] for each used c
-        #   mixing_c = sum_i y[i,c] (# distinct groups in c)
+        # Minimize [ alpha * underfill + beta * mixing ], summed over all contingents at once
+        #   underfill = sum_c (capacity * z[c] - sum_i x[i,c])
+        #   mixing = sum_{i,c} y[i,c] (# distinct groups per contingent, summed)
+        # With use_all every x is pinned by 4b, so sum_{i,c} x[i,c] is just total_people and stays a constant.
+        # Otherwise it's read off the per-contingent loads, one term per contingent rather than one per x.
+        # Everything goes into a single flat weighted sum: (z, alpha * capacity), (load, -alpha), (y, beta)
         
-        objective_terms = []
-        for c in range(max_contingents):
-            # underfill_c
-            underfill_c = capacity * z[c] - solver.Sum([x[(i, c)] for i in range(N)])
-            # mixing_c = sum of y[i,c]
-            mixing_c = solver.Sum([y[(i, c)] for i in range(N)])
-            # combine them
-            objective_terms.append(alpha * underfill_c + beta * mixing_c)
-
-        total_objective_expr = solver.Sum(objective_terms)
-        solver.Minimize(total_objective_expr)
+        objective_vars = list(z.values())
+        objective_weights = [alpha * capacity] * len(objective_vars)
+        if not use_all:
+            objective_vars += load
+            objective_weights += [-alpha] * len(load)
+        if beta != 0:
+            objective_vars += list(y.values())
+            objective_weights += [beta] * len(y)
+
+        objective = cp_model.LinearExpr.WeightedSum(objective_vars, objective_weights)
+        model.Minimize(objective - alpha * total_people if use_all else objective)
+
+        # Warm-start the search from the greedy packing
+        hint = greedy
+        for (i, c), x_var in x.items():
+            if not whole_only[i]:
+                model.AddHint(x_var, int(hint[c, i]))
+            if (i, c) in y:
+                model.AddHint(y[(i, c)], bool(hint[c, i]))
+        for c, used in enumerate(hint.any(axis=1)):
+            model.AddHint(z[c], bool(used))
+        for c, filled in enumerate(hint.sum(axis=1).tolist()):
+            model.AddHint(load[c], filled)
 
         elapsed = time.time() - start_time
-        print(colored(f"     ✓ Objective function configured ({elapsed:.2f}s)", 'green'))
+        log(colored(f"     ✓ Objective function configured ({elapsed:.2f}s)", 'green'))
         
         update_spinner('Solving...')
-        print(colored("\n[5/5] Solving the optimization problem...", 'cyan'))
+        log(colored("\n[5/5] Solving the optimization problem...", 'cyan'))
         
         # 6) Solve
-        status = solver.Solve()
-        if status not in (solver.OPTIMAL, solver.FEASIBLE):
-            raise Exception("No feasible solution found by the solver.")
+        solver = cp_model.CpSolver()
+        solver.parameters.num_search_workers = num_workers or os.cpu_count()
+        solver.parameters.max_time_in_seconds = time_limit
+        # Full LP relaxation of the linking and load rows; tightens the bound on this small, Big-M heavy model
+        solver.parameters.linearization_level = 2
+
+        if strategy == "lex" and beta != 0:
+            # Stage 1: underfill alone, with half the time budget
+            underfill = capacity * cp_model.LinearExpr.Sum(list(z.values())) - (
+                total_people if use_all else cp_model.LinearExpr.Sum(load)
+            )
+            model.Minimize(underfill)
+            solver.parameters.max_time_in_seconds = time_limit / 2
+            status = solver.Solve(model)
+            if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+                raise Exception("No feasible solution found by the solver.")
+            # Stage 2 is only a lexicographic optimum if stage 1's underfill is
+            underfill_optimal = status == cp_model.OPTIMAL
+
+            # Stage 2: mixing, without giving back any underfill, warm-started from the stage 1 solution
+            model.Add(underfill <= round(solver.ObjectiveValue()))
+            model.ClearHints()
+            for (i, c), x_var in x.items():
+                if not whole_only[i]:
+                    model.AddHint(x_var, solver.Value(x_var))
+            for var in [*y.values(), *z.values(), *load]:
+                model.AddHint(var, solver.Value(var))
+
+            model.Minimize(cp_model.LinearExpr.Sum(list(y.values())))
+            solver.parameters.max_time_in_seconds = max(time_limit - (time.time() - start_time), time_limit / 2)
+            status = solver.Solve(model)
+            if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+                raise Exception("No feasible solution found by the solver.")
+
+            # Report the same alpha * underfill + beta * mixing value as the weighted strategy
+            objective_value = alpha * solver.Value(underfill) + beta * solver.ObjectiveValue()
+            optimal = underfill_optimal and status == cp_model.OPTIMAL
+        else:
+            status = solver.Solve(model)
+            if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+                raise Exception("No feasible solution found by the solver.")
+            objective_value = solver.ObjectiveValue()
+            optimal = status == cp_model.OPTIMAL
 
         elapsed = time.time() - start_time
-        print(colored(f"     ✓ Solution found ({elapsed:.2f}s)", 'green'))
+        log(colored(f"     ✓ Solution found ({elapsed:.2f}s)", 'green'))
         
         update_spinner('Extracting solution...')
         
         # 7) Extract solution
-        solver_contingents = []
-        for c in range(max_contingents):
-            assigned_sum = sum(int(x[(i, c)].solution_value()) for i in range(N))
-            if assigned_sum == 0:
-                continue  # skip empty
-            cont_dict = {}
-            for i in range(N):
-                val = int(x[(i, c)].solution_value())
-                if val > 0:
-                    cont_dict[groups[i]] = val
-            solver_contingents.append(cont_dict)
+        # Pull the whole solution vector from the response in one call and gather the x values into a
+        # (contingent, group) matrix by variable index, then do the reductions in NumPy.
+        # Groups placed whole are read from y and scaled by A[i]
+        solution = np.asarray(solver.ResponseProto().solution, dtype=np.int32)
+        x_index = np.array(
+            [[(y if whole_only[i] else x)[(i, c)].Index() for i in group_ids] for c in contingent_ids], dtype=np.intp
+        ).reshape(max_contingents, N)
+        x_scale = np.where(whole_only, A_np, 1).astype(np.int32)
+        vals = solution[x_index] * x_scale
+
+        solver_contingents = contingents_from_matrix(vals, groups)
 
         # Combine pre-allocated contingents with solver's results
         all_contingents = pre_allocated_contingents + solver_contingents
@@ -319,17 +556,135 @@ def allocate_contingents(
         total_elapsed = time.time() - start_time
         spinner.succeed(colored(f'Optimization completed in {total_elapsed:.2f} seconds', 'green'))
         
-        return all_contingents, solver.Objective().Value()
+        return result(all_contingents, objective_value, optimal)
 
     except Exception as e:
         spinner.fail(colored(f'Error during optimization: {str(e)}', 'red'))
         raise e
 
+def _solve_one(config, num_workers=1, return_exceptions=False):
+    """Worker for solve_batch: one quiet solve, single-threaded by default so each process keeps to one CPU."""
+    try:
+        # Overrides any verbose / num_workers already in the config rather than passing them twice
+        return allocate_contingents(**{**config, "verbose": False, "num_workers": num_workers})
+    except Exception as e:
+        if not return_exceptions:
+            raise
+        return e
+
+def solve_batch(configs, num_workers=None, return_exceptions=False):
+    """
+    Solve several allocation problems in parallel, one process per configuration (e.g. a sweep over alpha/beta).
+
+    Each solve runs a single CP-SAT search worker, so the pool doesn't oversubscribe the CPU. With a single worker
+    (or a single config) the solves run one after another in this process instead, each using num_workers search workers.
+
+    Args:
+        configs (list): Dicts of keyword arguments for allocate_contingents (group_sizes, capacity, strict_min_capacity, ...).
+        num_workers (int or None): Number of worker processes. Defaults to os.cpu_count().
+        return_exceptions (bool): If True, a config that fails to solve gets the raised exception in its place in the
+            results instead of aborting the whole batch.
+
+    Returns:
+        list: A (contingents, objective_value) tuple for each config, in the same order as configs.
+    """
+    num_workers = num_workers or os.cpu_count()
+    if num_workers == 1 or len(configs) <= 1:
+        # Nothing to run in parallel, so stay in this process and skip starting workers that each re-import OR-Tools
+        return [_solve_one(config, num_workers, return_exceptions) for config in configs]
+
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        return list(executor.map(_solve_one, configs, repeat(1), repeat(return_exceptions)))
+
+def parse_sweep(specs):
+    """
+    Parse --sweep arguments of the form PARAM=V1,V2,... into {PARAM: [V1, V2, ...]}.
+
+    Values are read as JSON, so numbers come back as int/float and "null" as None; anything else is kept as a string.
+    """
+    def parse_value(v):
+        try:
+            return json.loads(v)
+        except json.JSONDecodeError:
+            return v
+
+    grid = {}
+    for spec in specs:
+        name, sep, values = spec.partition("=")
+        if not sep or not values:
+            raise ValueError(f"Invalid sweep spec '{spec}', expected PARAM=V1,V2,...")
+        grid[name] = [parse_value(v) for v in values.split(",")]
+    return grid
+
+def run_sweep(config, grid):
+    """
+    Solve every combination of the swept parameters in parallel and print one summary line per combination.
+
+    A combination that can't be solved gets an error line of its own; the rest of the sweep still runs.
+    Raises ValueError only for unknown sweep parameters.
+    """
+    params = list(grid)
+    unknown = [p for p in params if p not in config or p == "group_sizes"]
+    if unknown:
+        raise ValueError(f"Unknown sweep parameter(s): {', '.join(unknown)}")
+
+    combos = list(product(*(grid[p] for p in params)))
+    configs = [
+        {
+            "group_sizes": config["group_sizes"],
+            "capacity": config["capacity"],
+            "strict_min_capacity": config["strict_min_capacity"],
+            "contingent_row_size": config["contingent_row_size"],
+            "alpha": config["alpha"],
+            "beta": config["beta"],
+            "fix_num_contingents": config["fix_num_contingents"],
+            "time_limit": config["time_limit"],
+            "strategy": config["strategy"],
+            **dict(zip(params, combo)),
+        }
+        for combo in combos
+    ]
+
+    print(colored(f"\nSweeping {len(configs)} configurations over {', '.join(params)}...", 'cyan'))
+    results = solve_batch(configs, return_exceptions=True)
+
+    print(colored("\n=== Sweep Results ===", 'yellow', attrs=['bold']))
+    for combo, result in zip(combos, results):
+        settings = ", ".join(f"{p}={v}" for p, v in zip(params, combo))
+        if isinstance(result, Exception):
+            print(colored(f"{settings}: failed: {result}", 'red'))
+            continue
+
+        contingents, obj_val = result
+        mixed = sum(len(cont) > 1 for cont in contingents)
+        print(f"{settings}: objective={obj_val:.2f}, contingents={len(contingents)}, mixed={mixed}")
+
 def main():
+    parser = argparse.ArgumentParser(description="Allocate parade groups into contingents.")
+    parser.add_argument(
+        "--sweep",
+        nargs="+",
+        metavar="PARAM=V1,V2,...",
+        help="Solve every combination of the given parameter values in parallel (e.g. --sweep alpha=0.5,1,2 beta=1,5,10) and print a summary instead of writing a CSV",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always run the solver, ignoring and not updating the result cache in cache/",
+    )
+    args = parser.parse_args()
+
     print(colored("\n=== Parade Allocation Optimizer ===", 'yellow', attrs=['bold']))
     
     # Load configuration
     config = load_config()
+
+    if args.sweep:
+        try:
+            run_sweep(config, parse_sweep(args.sweep))
+        except ValueError as e:
+            parser.error(str(e))
+        return
     
     # Extract values from config
     contingent_row_size = config["contingent_row_size"]
@@ -340,24 +695,46 @@ def main():
     beta = config["beta"]
     fix_num_contingents = config["fix_num_contingents"]
     time_limit = config["time_limit"]
+    strategy = config["strategy"]
 
     total_people = sum(info["size"] for info in group_sizes.values())
-    
-    try:
-        contingents, obj_val = allocate_contingents(
-            group_sizes=group_sizes,
-            capacity=capacity,
-            strict_min_capacity=strict_min_capacity,
-            contingent_row_size=contingent_row_size,
-            alpha=alpha,
-            beta=beta,
-            use_all=True,
-            fix_num_contingents=fix_num_contingents,
-            time_limit=time_limit
-        )
-    except Exception as e:
-        print(colored(f'Optimization failed: {str(e)}', 'red'))
-        return
+
+    # Proven-optimal results are cached by a hash of the full configuration and of this script, so re-running with an
+    # unchanged input.json skips the solve, and any change to the solver invalidates what was cached before it
+    config_key = hashlib.sha1(json.dumps(config, sort_keys=True).encode() + Path(__file__).read_bytes()).hexdigest()
+    cache_path = Path("cache") / f"{config_key}.json"
+
+    if not args.no_cache and cache_path.exists():
+        with open(cache_path, 'r') as f:
+            cached = json.load(f)
+        contingents, obj_val = cached["contingents"], cached["objective_value"]
+        print(colored(f"Loaded cached result from {cache_path}", 'green'))
+    else:
+        try:
+            contingents, obj_val, optimal = allocate_contingents(
+                group_sizes=group_sizes,
+                capacity=capacity,
+                strict_min_capacity=strict_min_capacity,
+                contingent_row_size=contingent_row_size,
+                alpha=alpha,
+                beta=beta,
+                use_all=True,
+                fix_num_contingents=fix_num_contingents,
+                time_limit=time_limit,
+                strategy=strategy,
+                return_optimal=True
+            )
+        except Exception as e:
+            print(colored(f'Optimization failed: {str(e)}', 'red'))
+            return
+
+        # A result cut short by the time limit might be beaten by a longer run, so it isn't cached
+        if not optimal:
+            print(colored("Solver hit the time limit before proving optimality; result not cached", 'yellow'))
+        elif not args.no_cache:
+            cache_path.parent.mkdir(exist_ok=True)
+            with open(cache_path, 'w') as f:
+                json.dump({"contingents": contingents, "objective_value": obj_val}, f)
 
     print(colored("\n=== Results ===", 'yellow', attrs=['bold']))
     print(f"Total people: {total_people}")
@@ -370,15 +747,17 @@ def main():
     print(f"\nObjective value: {obj_val:.2f} (lower = better)")
     print(f"(alpha={alpha}, beta={beta})\n")
 
-    grand_total_assigned = 0
-    for idx, cont in enumerate(contingents, start=1):
-        total_in_cont = sum(cont.values())
-        letters_used = len(cont)
-        groups_list = ", ".join(f"{g}:{n}" for g, n in cont.items())
+    # One (contingent #, total, group assignments, # groups) row per contingent, shared by the printout and the CSV
+    summaries = [
+        (idx, sum(cont.values()), ", ".join(f"{g}:{n}" for g, n in cont.items()), len(cont))
+        for idx, cont in enumerate(contingents, start=1)
+    ]
+
+    for idx, total_in_cont, groups_list, letters_used in summaries:
         print(f"Contingent #{idx}: total={total_in_cont}, #groups={letters_used}")
         print(f"   -> {groups_list}")
         # print(f"\nFormation:\n{create_contingent_ascii(total_in_cont, contingent_row_size)}\n")
-        grand_total_assigned += total_in_cont
+    grand_total_assigned = sum(total_in_cont for _, total_in_cont, _, _ in summaries)
 
     print("\n-----------------------------------------")
     print(f"Number of contingents used: {len(contingents)}")
@@ -387,59 +766,59 @@ def main():
     print("=========================================")
 
     # Prepare CSV output
-    timestamp = datetime.now().strftime("%d%m%y_%H%M%S")
+    # One clock read for both the file name and the "Generated on" row
+    now = datetime.now()
+    timestamp = now.strftime("%d%m%y_%H%M%S")
     csv_filename = f"output/parade_allocation_{timestamp}.csv"
 
-    with open(csv_filename, 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        
-        # Write header information
-        writer.writerow(['Parade Allocation Results'])
-        writer.writerow(['Generated on', datetime.now().strftime("%d%m%y %H:%M")])
-        writer.writerow([])
-        
-        # Write input parameters
-        writer.writerow(['Input Parameters'])
-        writer.writerow(['Parameter', 'Value'])
-        writer.writerow(['Contingent Row Size', contingent_row_size])
-        writer.writerow(['Contingent Capacity', capacity])
-        writer.writerow(['Strict Minimum Capacity', strict_min_capacity])
-        writer.writerow(['Alpha (underfill penalty)', alpha])
-        writer.writerow(['Beta (mixing penalty)', beta])
-        writer.writerow(['Fixed Number of Contingents', fix_num_contingents])
-        writer.writerow(['Solver Time Limit (seconds)', time_limit])
-        writer.writerow([])
-        
-        # Write group sizes
-        writer.writerow(['Input Group Sizes'])
-        writer.writerow(['Group', 'Size', 'Avoid Split'])
-        for group, info in group_sizes.items():
-            writer.writerow([group, info['size'], info['avoid_split']])
-        writer.writerow([])
-        
-        # Write results summary
-        writer.writerow(['Results Summary'])
-        writer.writerow(['Total People', total_people])
-        writer.writerow(['Objective Value', f"{obj_val:.2f}"])
-        writer.writerow([])
-        
-        # Write contingent details header
-        writer.writerow(['Contingent Details'])
-        writer.writerow(['Contingent #', 'Total People', 'Group Assignments', 'Number of Groups'])
-        
-        # Write each contingent's details
-        for idx, cont in enumerate(contingents, start=1):
-            total_in_cont = sum(cont.values())
-            letters_used = len(cont)
-            groups_list = ", ".join(f"{g}:{n}" for g, n in cont.items())
-            writer.writerow([idx, total_in_cont, groups_list, letters_used])
-        
-        # Write summary statistics
-        writer.writerow([])
-        writer.writerow(['Summary Statistics'])
-        writer.writerow(['Total Contingents Used', len(contingents)])
-        writer.writerow(['Total People Assigned', grand_total_assigned])
-        writer.writerow(['All Members Assigned', 'Yes' if True else 'No'])
+    # Every row of the report, collected first and written in one go
+    rows = [
+        ['Parade Allocation Results'],
+        ['Generated on', now.strftime("%d%m%y %H:%M")],
+        [],
+
+        # Input parameters
+        ['Input Parameters'],
+        ['Parameter', 'Value'],
+        ['Contingent Row Size', contingent_row_size],
+        ['Contingent Capacity', capacity],
+        ['Strict Minimum Capacity', strict_min_capacity],
+        ['Alpha (underfill penalty)', alpha],
+        ['Beta (mixing penalty)', beta],
+        ['Fixed Number of Contingents', fix_num_contingents],
+        ['Solver Time Limit (seconds)', time_limit],
+        ['Solve Strategy', strategy],
+        [],
+
+        # Group sizes
+        ['Input Group Sizes'],
+        ['Group', 'Size', 'Avoid Split'],
+        *([group, info['size'], info['avoid_split']] for group, info in group_sizes.items()),
+        [],
+
+        # Results summary
+        ['Results Summary'],
+        ['Total People', total_people],
+        ['Objective Value', f"{obj_val:.2f}"],
+        [],
+
+        # Contingent details
+        ['Contingent Details'],
+        ['Contingent #', 'Total People', 'Group Assignments', 'Number of Groups'],
+        *summaries,
+
+        # Summary statistics
+        [],
+        ['Summary Statistics'],
+        ['Total Contingents Used', len(contingents)],
+        ['Total People Assigned', grand_total_assigned],
+        ['All Members Assigned', 'Yes' if True else 'No'],
+    ]
+
+    # Format the whole report in memory, then hit the disk with a single write
+    buffer = io.StringIO(newline='')
+    csv.writer(buffer).writerows(rows)
+    Path(csv_filename).write_text(buffer.getvalue(), newline='')
 
     print("\nResults have been saved to:", csv_filename)
 